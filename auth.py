@@ -4,11 +4,14 @@ Authentication utilities: password hashing, JWT token generation, role-based acc
 
 from datetime import datetime, timedelta
 from typing import Optional
+import hashlib
 import jwt
 import os
+import time
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
 from pydantic import BaseModel
+from services.shared_state import get_shared_state
 
 # Use Argon2 for password hashing (supports unlimited password length)
 hasher = PasswordHasher()
@@ -17,6 +20,7 @@ hasher = PasswordHasher()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "60"))  # Seconds a verified token stays cached
 
 
 
@@ -96,12 +100,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 def verify_token(token: str) -> Optional[dict]:
-    """Verify JWT token and return payload"""
+    """Verify JWT token and return payload
+
+    Successful verifications are cached in shared state (never past the
+    token's own expiry), so every worker benefits from one decode.
+    """
+    state = get_shared_state()
+    cache_key = "auth:token:" + hashlib.sha256(token.encode("utf-8")).hexdigest()
+    
+    payload = state.get(cache_key) if TOKEN_CACHE_TTL > 0 else None
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except jwt.InvalidTokenError:
         return None
+    
+    ttl = min(TOKEN_CACHE_TTL, payload.get("exp", 0) - time.time())
+    if ttl > 0:
+        state.set(cache_key, payload, ttl=ttl)
+    return payload
 
 
 # ============================================================================
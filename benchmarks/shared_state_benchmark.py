@@ -0,0 +1,92 @@
+"""
+Benchmark shared state backends with 1 versus N worker processes.
+
+Replays the same Zipf-distributed request stream (think repeated tokens or
+identical notes) round-robin across worker processes, each of which does a
+cache lookup and fills the cache on a miss. With the in-process backend every
+worker warms its own copy; with the SQLite backend all workers share one.
+
+    python benchmarks/shared_state_benchmark.py --workers 4 --requests 20000
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from services.shared_state import InProcessState, SQLiteState  # noqa: E402
+
+
+def _make_stream(requests: int, keys: int, seed: int):
+    """Zipf-like key popularity: a few hot keys and a long tail"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return [f"key:{k}" for k in rng.choices(range(keys), weights=weights, k=requests)]
+
+
+def _worker(backend, path, stream, results):
+    state = InProcessState() if backend == "memory" else SQLiteState(path=path)
+    hits = 0
+    latencies = []
+    for key in stream:
+        start = time.perf_counter()
+        if state.get(key) is not None:
+            hits += 1
+        else:
+            state.set(key, {"cached": key}, ttl=300)
+        latencies.append(time.perf_counter() - start)
+    results.put((hits, latencies))
+
+
+def run(backend: str, workers: int, stream):
+    """Replay the stream over `workers` processes and return hit rate and latency percentiles"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shared_state.db")
+        if backend == "sqlite":
+            SQLiteState(path=path)  # Create the schema before workers race for it
+
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=_worker, args=(backend, path, stream[i::workers], results))
+            for i in range(workers)
+        ]
+        for p in procs:
+            p.start()
+        collected = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+    hits = sum(h for h, _ in collected)
+    latencies = sorted(latency for _, worker_latencies in collected for latency in worker_latencies)
+    return {
+        "hit_rate": hits / len(stream),
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99) - 1] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stream = _make_stream(args.requests, args.keys, args.seed)
+    print(f"{args.requests} requests over {args.keys} keys")
+    print(f"{'backend':<8} {'workers':>7} {'hit rate':>9} {'p50 us':>9} {'p99 us':>9}")
+    for backend in ("memory", "sqlite"):
+        for workers in sorted({1, args.workers}):
+            r = run(backend, workers, stream)
+            print(f"{backend:<8} {workers:>7} {r['hit_rate']:>9.1%} {r['p50_us']:>9.1f} {r['p99_us']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
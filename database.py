@@ -41,7 +41,10 @@ class User(Base):
     
     # Relationships
     patient_records = relationship("PatientRecord", back_populates="owner", cascade="all, delete-orphan")
-    doctor_patients = relationship("DoctorPatientAccess", back_populates="doctor", cascade="all, delete-orphan")
+    doctor_patients = relationship(
+        "DoctorPatientAccess", back_populates="doctor", cascade="all, delete-orphan",
+        foreign_keys="DoctorPatientAccess.doctor_id"
+    )
     
     def __repr__(self):
         return f"<User(email={self.email}, role={self.role})>"
@@ -1,16 +1,24 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from services.openai_service import generate_health_summary
-from database import init_db, get_db, User, SessionLocal
+from services.profiler import (
+    should_profile, profile_request, list_profiles, get_profile_path, render_profile_text
+)
+from services.static_assets import PrecompressedStaticFiles
+from services.http_cache import compute_etag, cached_response
+from services.shared_state import get_shared_state
+from database import init_db, get_db, User, PatientRecord, DoctorPatientAccess, SessionLocal
 from auth import (
     UserRegister, UserLogin, TokenResponse, UserResponse,
     hash_password, verify_password, create_access_token, verify_token
 )
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+import json
 import os
+import time
 
 load_dotenv()
 
@@ -19,6 +27,10 @@ init_db()
 
 app = FastAPI(title="Smart EHR Summarizer", version="1.1.0")
 
+# Per-user throttling for /summarize, counted in shared state across workers
+SUMMARIZE_RATE_LIMIT = int(os.getenv("SUMMARIZE_RATE_LIMIT", "0"))  # Requests per window; 0 disables (default)
+SUMMARIZE_RATE_WINDOW = int(os.getenv("SUMMARIZE_RATE_WINDOW", "60"))  # Seconds
+
 # Add CORS middleware for frontend access
 app.add_middleware(
     CORSMiddleware,
@@ -28,9 +40,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files (frontend)
+# Mount static files (frontend): content-hashed, precompressed and cache-friendly
+static_files = None
 if os.path.exists("static"):
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+    static_files = PrecompressedStaticFiles(directory="static")
+    app.mount("/static", static_files, name="static")
 else:
     os.makedirs("static", exist_ok=True)
 
@@ -40,8 +54,12 @@ else:
 # ============================================================================
 
 @app.get("/")
-def root():
+def root(request: Request):
     """Serve landing page"""
+    if static_files:
+        response = static_files.bundle.response("index.html", request.headers)
+        if response:
+            return response
     return FileResponse("static/index.html")
 
 
@@ -137,13 +155,12 @@ def verify_user(authorization: str = Header(None), db: Session = Depends(get_db)
 # ORIGINAL SUMMARIZE ENDPOINT (with auth)
 # ============================================================================
 
-@app.post("/summarize")
-def summarize(payload: dict, authorization: str = Header(None), db: Session = Depends(get_db)):
-    """Summarize medical text (requires authentication)"""
+def _authenticate(authorization: str) -> dict:
+    """Extract and verify a bearer token, returning its payload"""
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing authorization header")
     
-    # Extract and verify token
+    # Extract token from "Bearer <token>"
     try:
         scheme, token = authorization.split()
         if scheme.lower() != "bearer":
@@ -155,7 +172,176 @@ def summarize(payload: dict, authorization: str = Header(None), db: Session = De
     if not payload_data:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
+    return payload_data
+
+
+def _enforce_rate_limit(scope: str, user_id, limit: int, window: int):
+    """Fixed-window rate limit per user; raises 429 once the window is used up"""
+    if limit <= 0:
+        return
+    now = time.time()
+    window_index = int(now // window)
+    count = get_shared_state().incr(f"ratelimit:{scope}:{user_id}:{window_index}", ttl=window)
+    if count > limit:
+        retry_after = max(1, int((window_index + 1) * window - now))
+        raise HTTPException(
+            status_code=429, detail="Too many requests", headers={"Retry-After": str(retry_after)}
+        )
+
+
+@app.post("/summarize")
+def summarize(
+    payload: dict,
+    response: Response,
+    authorization: str = Header(None),
+    x_profile: str = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Summarize medical text (requires authentication)
+
+    Doctors can send `X-Profile: 1` to profile this single request; the stored
+    profile id is returned in the `X-Profile-Id` response header.
+    """
+    payload_data = _authenticate(authorization)
+    _enforce_rate_limit("summarize", payload_data.get("user_id"), SUMMARIZE_RATE_LIMIT, SUMMARIZE_RATE_WINDOW)
+    
     if "text" not in payload:
         raise HTTPException(status_code=400, detail="Missing medical text")
     
+    if should_profile(payload_data, x_profile):
+        # Bypass the summary cache so the profile shows the real work
+        with profile_request("summarize") as profile:
+            result = generate_health_summary(payload["text"], use_cache=False)
+        if profile["profile_id"]:
+            response.headers["X-Profile-Id"] = profile["profile_id"]
+        return result
+    
     return generate_health_summary(payload["text"])
+
+
+# ============================================================================
+# DASHBOARD BOOTSTRAP
+# ============================================================================
+
+BOOTSTRAP_RECORD_LIMIT = 50
+
+
+def _decode_entities(value) -> list:
+    """Decode a JSON list column, tolerating empty or malformed values"""
+    if not value:
+        return []
+    try:
+        decoded = json.loads(value)
+    except ValueError:
+        return []
+    return decoded if isinstance(decoded, list) else []
+
+
+def _serialize_record(record: PatientRecord) -> dict:
+    """Patient record with its latest summary for the dashboard"""
+    summary = record.summary
+    return {
+        "id": record.id,
+        "patient_id": record.patient_id,
+        "file_name": record.file_name,
+        "upload_date": record.upload_date,
+        "summary": {
+            "summary": summary.summary,
+            "medications": _decode_entities(summary.medications),
+            "allergies": _decode_entities(summary.allergies),
+            "risks": _decode_entities(summary.risks),
+            "generated_at": summary.generated_at,
+        } if summary else None,
+    }
+
+
+@app.get("/dashboard/bootstrap")
+def dashboard_bootstrap(request: Request, authorization: str = Header(None), db: Session = Depends(get_db)):
+    """Everything a dashboard needs after login in one response
+
+    Returns the current user, their patients (doctors only) and the most
+    recent records with summaries. Clients should revalidate with
+    If-None-Match; an unchanged view returns 304 with no body.
+    """
+    payload_data = _authenticate(authorization)
+    
+    user = db.query(User).filter(User.id == payload_data["user_id"]).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    patients = []
+    if user.role == "doctor":
+        rows = (
+            db.query(User, DoctorPatientAccess.access_level)
+            .join(DoctorPatientAccess, DoctorPatientAccess.patient_id == User.id)
+            .filter(DoctorPatientAccess.doctor_id == user.id)
+            .order_by(User.full_name)
+            .all()
+        )
+        patients = [
+            {"id": p.id, "email": p.email, "full_name": p.full_name, "access_level": access_level}
+            for p, access_level in rows
+        ]
+        patient_ids = [p["id"] for p in patients]
+    else:
+        patient_ids = [user.id]
+    
+    records = []
+    if patient_ids:
+        records = (
+            db.query(PatientRecord)
+            .options(selectinload(PatientRecord.summary))
+            .filter(PatientRecord.patient_id.in_(patient_ids))
+            .order_by(PatientRecord.upload_date.desc(), PatientRecord.id.desc())
+            .limit(BOOTSTRAP_RECORD_LIMIT)
+            .all()
+        )
+    
+    data = {
+        "user": UserResponse.model_validate(user),
+        "patients": patients,
+        "records": [_serialize_record(r) for r in records],
+    }
+    body = json.dumps(jsonable_encoder(data), separators=(",", ":"), sort_keys=True).encode("utf-8")
+    
+    return cached_response(
+        body, "application/json", compute_etag(body), "private, no-cache", request.headers,
+        compress=True, vary="Authorization, Accept-Encoding"
+    )
+
+
+# ============================================================================
+# PROFILING ENDPOINTS (doctor only)
+# ============================================================================
+
+def _require_doctor(authorization: str) -> dict:
+    """Authenticate and require the doctor role"""
+    payload_data = _authenticate(authorization)
+    if payload_data.get("role") != "doctor":
+        raise HTTPException(status_code=403, detail="Requires doctor role")
+    return payload_data
+
+
+@app.get("/debug/profiles")
+def get_profiles(authorization: str = Header(None)):
+    """List stored request profiles, newest first"""
+    _require_doctor(authorization)
+    return list_profiles()
+
+
+@app.get("/debug/profiles/{profile_id}")
+def download_profile(profile_id: str, format: str = "prof", authorization: str = Header(None)):
+    """Download a stored profile as a pstats dump, or as a text report with ?format=text"""
+    _require_doctor(authorization)
+    
+    path = get_profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if format == "text":
+        report = render_profile_text(profile_id)
+        if report is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return PlainTextResponse(report)
+    
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
@@ -0,0 +1,93 @@
+"""
+HTTP caching helpers: ETags, conditional GET and content-encoding negotiation
+"""
+
+import gzip
+import hashlib
+from typing import Dict, Iterable, Optional
+
+from starlette.responses import Response
+
+# Responses smaller than this are not worth compressing on the fly
+GZIP_MINIMUM_SIZE = 1024
+
+
+def compute_etag(body: bytes) -> str:
+    """Strong ETag derived from the response body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def variant_etag(etag: str, encoding: Optional[str]) -> str:
+    """ETag for a content-coded variant, e.g. "abc" -> "abc-gzip" """
+    if not encoding:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def choose_encoding(accept_encoding: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """Pick the best content encoding the client accepts, preferring brotli over gzip
+
+    A "*" entry applies to every encoding not listed explicitly.
+    """
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+
+    available = set(available)
+    for encoding in ("br", "gzip"):
+        quality = accepted[encoding] if encoding in accepted else accepted.get("*", 0)
+        if encoding in available and quality > 0:
+            return encoding
+    return None
+
+
+def cached_response(
+    body: bytes,
+    media_type: str,
+    etag: str,
+    cache_control: str,
+    headers,
+    encodings: Optional[Dict[str, bytes]] = None,
+    compress: bool = False,
+    vary: str = "Accept-Encoding",
+) -> Response:
+    """Build a response honouring If-None-Match and Accept-Encoding.
+
+    `encodings` maps content encodings to precompressed bodies. With
+    `compress=True` and no precompressed variants, large bodies are gzipped
+    on the fly when the client accepts it.
+    """
+    encodings = encodings or {}
+    available = list(encodings)
+    if compress and not encodings and len(body) >= GZIP_MINIMUM_SIZE:
+        available = ["gzip"]
+    encoding = choose_encoding(headers.get("accept-encoding"), available)
+
+    # Each content-coding is a different representation, so it gets its own strong ETag
+    etag = variant_etag(etag, encoding)
+    response_headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": vary}
+
+    if etag_matches(headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=response_headers)
+
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+        body = encodings[encoding] if encoding in encodings else gzip.compress(body, compresslevel=6)
+
+    return Response(content=body, media_type=media_type, headers=response_headers)
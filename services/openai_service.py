@@ -1,7 +1,11 @@
+import hashlib
 import os
 import re
+import time
 from dotenv import load_dotenv
-from typing import Dict, List
+from typing import Dict
+
+from services.shared_state import get_shared_state
 
 load_dotenv()
 
@@ -10,74 +14,170 @@ AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", "600"))  # Seconds; 0 disables the summary cache
+
+
+# Extraction bounds: patterns only ever look at a bounded window, long inputs are
+# scanned in overlapping chunks, and each call stops after a CPU time budget
+MAX_EXTRACT_CHUNK = int(os.getenv("MAX_EXTRACT_CHUNK", "20000"))
+EXTRACT_CHUNK_OVERLAP = 512
+EXTRACT_TIME_BUDGET_SECONDS = float(os.getenv("EXTRACT_TIME_BUDGET_SECONDS", "1.0"))
+MAX_ALLERGY_LIST_CHARS = 200
+MAX_ALLERGY_SEPARATOR_CHARS = 20
+
+# Expanded medication list: antibiotics, anticoagulants, cardiac, diabetes, hypertension
+_MEDS_RE = re.compile(
+    r"\b(aspirin|ibuprofen|metformin|lisinopril|atorvastatin|amoxicillin|ciprofloxacin|azithromycin|"
+    r"warfarin|apixaban|rivaroxaban|dabigatran|metoprolol|carvedilol|diltiazem|amlodipine|"
+    r"omeprazole|ranitidine|sertraline|fluoxetine|amitriptyline|gabapentin|naproxen|"
+    r"acetaminophen|tramadol|oxycodone|morphine|insulin|glipizide|glyburide)\b",
+    flags=re.I,
+)
+
+# Allergy lists are capped at MAX_ALLERGY_LIST_CHARS and the whitespace around
+# "to"/":" at MAX_ALLERGY_SEPARATOR_CHARS, so a failed match can never rescan the
+# rest of the document and no match is longer than EXTRACT_CHUNK_OVERLAP
+# Pattern 1: "allergy to X" or "allergies to X"
+_ALLERGY_TO_RE = re.compile(
+    r"allerg(?:y|ies)\s{1,%d}to\s{1,%d}([\w\s,()]{1,%d}?)(?:\.|,|;|$)"
+    % (MAX_ALLERGY_SEPARATOR_CHARS, MAX_ALLERGY_SEPARATOR_CHARS, MAX_ALLERGY_LIST_CHARS),
+    flags=re.I,
+)
+# Pattern 2: "Allergies: X, Y, Z"
+_ALLERGY_LIST_RE = re.compile(
+    r"Allergies?:\s{1,%d}([\w\s,()-]{1,%d}?)(?:\.|$|\n)" % (MAX_ALLERGY_SEPARATOR_CHARS, MAX_ALLERGY_LIST_CHARS),
+    flags=re.I,
+)
+# Pattern 3: common allergy keywords
+_ALLERGY_KEYWORDS = ["latex", "penicillin", "sulfa", "codeine", "nsaids", "ace inhibitors"]
+_ALLERGY_KEYWORD_RES = [(allergy, re.compile(re.escape(allergy), flags=re.I)) for allergy in _ALLERGY_KEYWORDS]
+
+# Expanded risk detection: cardiac, metabolic, smoking, cancer
+_RISK_KEYWORDS = {
+    "smoking": ["smok", "tobacco", "cigarette"],
+    "diabetes": ["diabetes", "diabetic", "dm", "type 2", "type 1"],
+    "hypertension": ["hypertens", "high blood pressure", "hbp"],
+    "stroke": ["stroke", "cva", "tia"],
+    "heart attack": ["heart attack", "mi", "myocardial infarction"],
+    "CAD": ["cad", "coronary artery disease"],
+    "angina": ["angina", "s/p mi", "cad.{0,200}chest"],  # More specific to avoid "chest pain" false positive
+    "arrhythmia": ["arrhythmia", "afib", "atrial fibrillation"],
+    "obesity": ["obesity", "obese"],
+    "asthma": ["asthma", "reactive airway"],
+    "COPD": ["copd", "chronic obstructive"],
+}
+_RISK_RES = [(risk_name, re.compile("|".join(keywords), flags=re.I)) for risk_name, keywords in _RISK_KEYWORDS.items()]
+
+_WHITESPACE_RE = re.compile(r"\s")
+
+
+def _iter_chunks(text: str):
+    """Yield (chunk, is_last) windows of at most MAX_EXTRACT_CHUNK characters.
+
+    Consecutive chunks overlap so matches spanning a boundary are still seen.
+    Chunks start and (except the last) end on whitespace where the overlap
+    allows, so a cut word such as "insulin|oma" cannot match as a whole one.
+    """
+    start = 0
+    while True:
+        end = start + MAX_EXTRACT_CHUNK
+        if end >= len(text):
+            yield text[start:], True
+            return
+        # Pull the end back to the last whitespace inside the overlap window
+        for i in range(end - 1, max(start, end - EXTRACT_CHUNK_OVERLAP) - 1, -1):
+            if text[i].isspace():
+                end = i
+                break
+        yield text[start:end], False
+        start = max(end - EXTRACT_CHUNK_OVERLAP, start + 1)
+        ws = _WHITESPACE_RE.search(text, start, end)
+        if ws:
+            start = ws.end()
+
 
+def _allergy_items(match, is_last: bool):
+    """Captured allergy list, or None if it runs into a chunk boundary the next chunk will rescan"""
+    if not match or (not is_last and match.end() == len(match.string)):
+        return None
+    return match.group(1)
 
-def _simple_entity_extract(text: str) -> Dict[str, List[str]]:
-    # Expanded medication list: antibiotics, anticoagulants, cardiac, diabetes, hypertension
-    meds_pattern = r"\b(aspirin|ibuprofen|metformin|lisinopril|atorvastatin|amoxicillin|ciprofloxacin|azithromycin|" \
-                   r"warfarin|apixaban|rivaroxaban|dabigatran|metoprolol|carvedilol|diltiazem|amlodipine|" \
-                   r"omeprazole|ranitidine|sertraline|fluoxetine|amitriptyline|gabapentin|naproxen|" \
-                   r"acetaminophen|tramadol|oxycodone|morphine|insulin|glipizide|glyburide)\b"
-    meds = re.findall(meds_pattern, text, flags=re.I)
-    
-    # Improved allergy extraction: handles "allergy to X", "allergies to X", and parenthetical reactions
+
+def _simple_entity_extract(text: str) -> Dict[str, object]:
+    """Extract medications, allergies and risks with bounded worst-case time.
+
+    Every pattern is linear in the chunk it scans. If the CPU time budget runs
+    out before all chunks are scanned, the entities found so far are returned
+    with "partial" set to True.
+    """
+    deadline = time.thread_time() + EXTRACT_TIME_BUDGET_SECONDS
+    meds = set()
     allergies = []
-    # Pattern 1: "allergy to X" or "allergies to X"
-    m = re.search(r"allerg(?:y|ies)\s+to\s+([\w\s,()]+?)(?:\.|,|;|$)", text, flags=re.I)
-    if m:
-        for item in re.split(r",|and|;", m.group(1)):
-            item = re.sub(r"\s*\([^)]*\)", "", item).strip()  # Remove parentheses and content
-            if item and item not in ["reaction", "anaphylaxis", "gi upset", "rash", "swelling"]:
-                allergies.append(item)
-    # Pattern 2: "Allergies: X, Y, Z"
-    m2 = re.search(r"Allergies?:\s+([\w\s,()-]+?)(?:\.|$|\n)", text, flags=re.I)
-    if m2:
-        for item in re.split(r",|and", m2.group(1)):
-            item = re.sub(r"\s*\([^)]*\)", "", item).strip()  # Remove parentheses and content
-            if item and len(item) > 1 and item not in allergies:
-                allergies.append(item)
-    # Pattern 3: common allergy keywords
-    for allergy in ["latex", "penicillin", "sulfa", "codeine", "nsaids", "ace inhibitors"]:
-        if re.search(f"(?:allerg(?:y|ies)\\s+to\\s+)?{allergy}", text, flags=re.I):
-            if allergy not in allergies:
+    risks = []
+    partial = False
+
+    for chunk, is_last in _iter_chunks(text):
+        # A match touching the end of a non-final chunk may be a cut word; the next chunk rescans it
+        meds.update(
+            m.group(1).lower() for m in _MEDS_RE.finditer(chunk) if is_last or m.end() < len(chunk)
+        )
+
+        # Improved allergy extraction: handles "allergy to X", "allergies to X", and parenthetical reactions
+        items = _allergy_items(_ALLERGY_TO_RE.search(chunk), is_last)
+        if items:
+            for item in re.split(r",|and|;", items):
+                item = re.sub(r"\s*\([^)]*\)", "", item).strip()  # Remove parentheses and content
+                if item and item not in ["reaction", "anaphylaxis", "gi upset", "rash", "swelling"]:
+                    if item not in allergies:
+                        allergies.append(item)
+        items = _allergy_items(_ALLERGY_LIST_RE.search(chunk), is_last)
+        if items:
+            for item in re.split(r",|and", items):
+                item = re.sub(r"\s*\([^)]*\)", "", item).strip()  # Remove parentheses and content
+                if item and len(item) > 1 and item not in allergies:
+                    allergies.append(item)
+        for allergy, pattern in _ALLERGY_KEYWORD_RES:
+            if allergy not in allergies and pattern.search(chunk):
                 allergies.append(allergy)
 
-    # Expanded risk detection: cardiac, metabolic, smoking, cancer
-    risks = []
-    risk_keywords = {
-        "smoking": ["smok", "tobacco", "cigarette"],
-        "diabetes": ["diabetes", "diabetic", "dm", "type 2", "type 1"],
-        "hypertension": ["hypertens", "high blood pressure", "hbp"],
-        "stroke": ["stroke", "cva", "tia"],
-        "heart attack": ["heart attack", "mi", "myocardial infarction"],
-        "CAD": ["cad", "coronary artery disease"],
-        "angina": ["angina", "s/p mi", "cad.*chest"],  # More specific to avoid "chest pain" false positive
-        "arrhythmia": ["arrhythmia", "afib", "atrial fibrillation"],
-        "obesity": ["obesity", "obese"],
-        "asthma": ["asthma", "reactive airway"],
-        "COPD": ["copd", "chronic obstructive"],
-    }
-    
-    for risk_name, keywords in risk_keywords.items():
-        for kw in keywords:
-            if re.search(kw, text, flags=re.I):
-                if risk_name not in risks:
-                    risks.append(risk_name)
-                break
+        for risk_name, pattern in _RISK_RES:
+            if risk_name not in risks and pattern.search(chunk):
+                risks.append(risk_name)
+
+        if not is_last and time.thread_time() > deadline:
+            partial = True
+            break
 
-    return {"medications": sorted(list({m.lower() for m in meds})), "allergies": sorted(list(set(allergies))), "risks": risks}
+    return {"medications": sorted(meds), "allergies": sorted(set(allergies)), "risks": risks, "partial": partial}
 
 
-def generate_health_summary(medical_text: str) -> Dict[str, object]:
+def generate_health_summary(medical_text: str, use_cache: bool = True) -> Dict[str, object]:
     """Return a concise summary and extracted flags.
 
     If Azure OpenAI is configured, the function will call the LLM. Otherwise
     it returns a local mock summary and simple entity extraction to allow
-    local testing without credentials.
+    local testing without credentials. Pass use_cache=False to always do the
+    work, e.g. when the call is being profiled.
     """
     if not medical_text:
         raise ValueError("medical_text must be a non-empty string")
 
+    if not use_cache or SUMMARY_CACHE_TTL <= 0:
+        return _summarize(medical_text)
+
+    # Identical notes are summarized once per TTL across all workers
+    state = get_shared_state()
+    cache_key = "summary:" + hashlib.sha256(medical_text.encode("utf-8")).hexdigest()
+    result = state.get(cache_key)
+    if result is None:
+        result = _summarize(medical_text)
+        if not result["partial"]:
+            state.set(cache_key, result, ttl=SUMMARY_CACHE_TTL)
+    return result
+
+
+def _summarize(medical_text: str) -> Dict[str, object]:
+    """Run entity extraction and the LLM (or mock) summary without caching"""
     entities = _simple_entity_extract(medical_text)
 
     # Import OpenAI lazily to avoid SDK credential checks at import time
@@ -113,10 +213,10 @@ def generate_health_summary(medical_text: str) -> Dict[str, object]:
             except Exception:
                 assistant_text = str(resp)
 
-        return {"summary": assistant_text, "allergies": entities.get("allergies", []), "medications": entities.get("medications", []), "risks": entities.get("risks", [])}
+        return {"summary": assistant_text, "allergies": entities.get("allergies", []), "medications": entities.get("medications", []), "risks": entities.get("risks", []), "partial": entities.get("partial", False)}
 
     # Mock fallback for local development/testing
     s = " ".join(medical_text.strip().splitlines())
     if len(s) > 300:
         s = s[:297].rsplit(" ", 1)[0] + "..."
-    return {"summary": f"MOCK SUMMARY: {s}", "allergies": entities.get("allergies", []), "medications": entities.get("medications", []), "risks": entities.get("risks", [])}
\ No newline at end of file
+    return {"summary": f"MOCK SUMMARY: {s}", "allergies": entities.get("allergies", []), "medications": entities.get("medications", []), "risks": entities.get("risks", []), "partial": entities.get("partial", False)}
\ No newline at end of file
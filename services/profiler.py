@@ -0,0 +1,218 @@
+"""
+On-demand request profiling for production debugging.
+
+A single request is profiled only when an authorized user asks for it (the
+X-Profile header) or when it is picked by the optional sampling rate. Profiles
+are written as pstats dumps into a bounded on-disk ring so a slow request can be
+inspected later with `python -m pstats` or snakeviz.
+
+Only the thread running the profiled request is traced. cProfile is not used
+because from Python 3.12 it is built on sys.monitoring, which records every
+thread in the interpreter and would mix concurrent requests into the dump.
+"""
+
+import io
+import marshal
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Profiling configuration
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "20"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ROLES = ["doctor"]
+
+_PROFILE_ID_RE = re.compile(r"^\d{13}-[a-z_]+-[0-9a-f]{8}$")
+
+# Only one request is profiled at a time; concurrent requests run unprofiled
+_profile_lock = threading.Lock()
+_last_stamp = 0
+
+
+class ThreadProfiler:
+    """Deterministic profiler for the calling thread, with pstats-compatible output.
+
+    Built on sys.setprofile, which is per-thread on every supported Python
+    version, so requests running on other threads are neither slowed down by
+    the Python-level hook nor recorded.
+    """
+
+    def __init__(self):
+        # key -> [primitive calls, calls, own time, cumulative time, {caller key: [same four]}]
+        self.stats: Dict[tuple, list] = {}
+        self._stack: List[list] = []  # [key, start time, time spent in children]
+        self._depth: Dict[tuple, int] = {}  # Active frames per key, to detect recursion
+        self._timer = time.perf_counter
+
+    def enable(self):
+        sys.setprofile(self._dispatch)
+
+    def disable(self):
+        sys.setprofile(None)
+
+    def _dispatch(self, frame, event, arg):
+        if event == "call":
+            code = frame.f_code
+            self._enter((code.co_filename, code.co_firstlineno, code.co_name))
+        elif event == "c_call":
+            name = getattr(arg, "__qualname__", None) or getattr(arg, "__name__", repr(arg))
+            module = getattr(arg, "__module__", None)
+            self._enter(("~", 0, f"<built-in method {module + '.' if module else ''}{name}>"))
+        else:  # return, c_return, c_exception
+            self._exit()
+
+    def _enter(self, key: tuple):
+        self._depth[key] = self._depth.get(key, 0) + 1
+        self._stack.append([key, self._timer(), 0.0])
+
+    def _exit(self):
+        if not self._stack:
+            # Frames that were already running when profiling started
+            return
+        key, start, child_time = self._stack.pop()
+        elapsed = self._timer() - start
+        self._depth[key] -= 1
+        primitive = self._depth[key] == 0
+        own_time = elapsed - child_time
+
+        entry = self.stats.setdefault(key, [0, 0, 0.0, 0.0, {}])
+        entries = [entry]
+        if self._stack:
+            parent = self._stack[-1]
+            parent[2] += elapsed
+            entries.append(entry[4].setdefault(parent[0], [0, 0, 0.0, 0.0]))
+        for e in entries:
+            e[0] += primitive
+            e[1] += 1
+            e[2] += own_time
+            if primitive:
+                e[3] += elapsed
+
+    def dump_stats(self, path: str):
+        """Write stats in the marshal format read by pstats.Stats"""
+        stats = {
+            key: (cc, nc, tt, ct, {caller: tuple(v) for caller, v in callers.items()})
+            for key, (cc, nc, tt, ct, callers) in self.stats.items()
+        }
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+
+def should_profile(token_payload: dict, profile_header: Optional[str]) -> bool:
+    """Decide whether the current request should be profiled"""
+    if token_payload.get("role") not in PROFILE_ROLES:
+        return False
+    if profile_header and profile_header.lower() in ("1", "true", "yes"):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def profile_request(label: str) -> Iterator[Dict[str, Optional[str]]]:
+    """Profile the enclosed block and store the result in the profile ring.
+
+    Yields a dict whose "profile_id" is filled in once the block finishes. If
+    another request is already being profiled the block runs unprofiled and
+    "profile_id" stays None.
+    """
+    result: Dict[str, Optional[str]] = {"profile_id": None}
+
+    if not _profile_lock.acquire(blocking=False):
+        yield result
+        return
+
+    if sys.getprofile() is not None:
+        # Another profiler or debugger already owns this thread
+        _profile_lock.release()
+        yield result
+        return
+
+    profiler = ThreadProfiler()
+    profiler.enable()
+
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        try:
+            result["profile_id"] = _save_profile(profiler, label)
+        finally:
+            _profile_lock.release()
+
+
+def _save_profile(profiler: ThreadProfiler, label: str) -> str:
+    """Dump profiler stats to disk and evict the oldest profiles beyond the ring size"""
+    global _last_stamp
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    # Keep ids strictly increasing so ring order is stable within a millisecond
+    _last_stamp = max(int(time.time() * 1000), _last_stamp + 1)
+    profile_id = f"{_last_stamp:013d}-{label}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+
+    # Always keep the profile just written so the returned id stays downloadable
+    for stale in _profile_files()[max(1, PROFILE_MAX_FILES):]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, stale))
+        except FileNotFoundError:
+            pass
+
+    return profile_id
+
+
+def _profile_files() -> List[str]:
+    """Stored profile file names, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = [n for n in os.listdir(PROFILE_DIR) if n.endswith(".prof") and _PROFILE_ID_RE.match(n[:-5])]
+    return sorted(names, reverse=True)
+
+
+def list_profiles() -> List[Dict[str, object]]:
+    """Describe stored profiles, newest first"""
+    profiles = []
+    for name in _profile_files():
+        path = os.path.join(PROFILE_DIR, name)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            continue
+        profile_id = name[:-5]
+        profiles.append({
+            "id": profile_id,
+            "label": profile_id.split("-")[1],
+            "created_at": int(profile_id.split("-")[0]) / 1000,
+            "size": size,
+        })
+    return profiles
+
+
+def get_profile_path(profile_id: str) -> Optional[str]:
+    """Return the on-disk path of a stored profile, or None if it does not exist"""
+    if not _PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+    return path if os.path.isfile(path) else None
+
+
+def render_profile_text(profile_id: str, limit: int = 40) -> Optional[str]:
+    """Render a stored profile as a cumulative-time pstats report"""
+    path = get_profile_path(profile_id)
+    if not path:
+        return None
+    out = io.StringIO()
+    try:
+        stats = pstats.Stats(path, stream=out)
+    except FileNotFoundError:
+        # Evicted from the ring after the existence check
+        return None
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
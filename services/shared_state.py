@@ -0,0 +1,268 @@
+"""
+Shared state for caches and rate limits.
+
+Two interchangeable backends with the same API:
+- InProcessState: a dict with LRU ordering, private to one worker process
+- SQLiteState: a local SQLite file shared by every uvicorn worker on the host
+
+Both support per-key TTLs, atomic counters and LRU eviction. Values must be
+JSON-serializable so they behave the same on either backend. Pick the backend
+with SHARED_STATE_BACKEND ("memory" or "sqlite").
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Shared state configuration
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory")
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "./shared_state.db")
+SHARED_STATE_MAX_ENTRIES = int(os.getenv("SHARED_STATE_MAX_ENTRIES", "10000"))
+
+
+def _expires_at(now: float, ttl: Optional[float]) -> Optional[float]:
+    """Absolute expiry for a TTL; None means the key never expires"""
+    return None if ttl is None else now + ttl
+
+
+def _already_expired(ttl: Optional[float]) -> bool:
+    """A zero or negative TTL means the value expires as soon as it is written"""
+    return ttl is not None and ttl <= 0
+
+
+class SharedState:
+    """Key-value store interface shared by all backends"""
+
+    def get(self, key: str) -> Optional[object]:
+        """Return the stored value, or None if missing or expired"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: object, ttl: Optional[float] = None):
+        """Store a value, expiring after `ttl` seconds if given.
+
+        A non-positive `ttl` stores nothing and removes any existing value.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """Remove a key if present"""
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically add to a counter and return the new value.
+
+        A missing or expired counter starts from zero and gets `ttl`; an
+        existing counter keeps its original expiry. A new counter with a
+        non-positive `ttl` is returned but not stored.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every key"""
+        raise NotImplementedError
+
+
+class InProcessState(SharedState):
+    """Thread-safe LRU dict private to the current process
+
+    Values are stored by reference; treat what `get` returns as read-only.
+    """
+
+    def __init__(self, max_entries: int = SHARED_STATE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float):
+        """Entry for key if it exists and has not expired; caller holds the lock"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, value: object, expires_at: Optional[float]):
+        """Insert an entry and evict least recently used ones; caller holds the lock"""
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: object, ttl: Optional[float] = None):
+        with self._lock:
+            if _already_expired(ttl):
+                self._data.pop(key, None)
+                return
+            self._store(key, value, _expires_at(time.time(), ttl))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry:
+                value, expires_at = entry[0] + amount, entry[1]
+            elif _already_expired(ttl):
+                return amount
+            else:
+                value, expires_at = amount, _expires_at(now, ttl)
+            self._store(key, value, expires_at)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteState(SharedState):
+    """Key-value store in a local SQLite file, shared across worker processes.
+
+    Uses WAL mode so readers do not block the writer. Reads refresh the LRU
+    timestamp at most once per second per key to keep write traffic low, and
+    eviction runs every `evict_every` writes, so the size bound is approximate.
+    """
+
+    def __init__(self, path: str = SHARED_STATE_PATH, max_entries: int = SHARED_STATE_MAX_ENTRIES,
+                 evict_every: int = 64):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_state ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_shared_state_accessed ON shared_state (accessed_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One autocommit connection per thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[object]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM shared_state WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at, accessed_at = row
+        if expires_at is not None and expires_at <= now:
+            conn.execute("DELETE FROM shared_state WHERE key = ? AND expires_at <= ?", (key, now))
+            return None
+        if accessed_at < now - 1:
+            conn.execute("UPDATE shared_state SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: object, ttl: Optional[float] = None):
+        if _already_expired(ttl):
+            self.delete(key)
+            return
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO shared_state (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), _expires_at(now, ttl), now),
+        )
+        self._after_write()
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        conn = self._conn()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value, expires_at FROM shared_state WHERE key = ?", (key,)).fetchone()
+            if row and (row[1] is None or row[1] > now):
+                value, expires_at = json.loads(row[0]) + amount, row[1]
+            else:
+                value, expires_at = amount, _expires_at(now, ttl)
+            if expires_at is not None and expires_at <= now:
+                conn.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO shared_state (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write()
+        return value
+
+    def clear(self):
+        self._conn().execute("DELETE FROM shared_state")
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        """Drop expired keys, then the least recently used ones beyond max_entries"""
+        conn = self._conn()
+        conn.execute("DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM shared_state").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM shared_state WHERE key IN "
+                "(SELECT key FROM shared_state ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+
+_state: Optional[SharedState] = None
+_state_lock = threading.Lock()
+
+
+def create_shared_state(backend: str = None) -> SharedState:
+    """Build a shared state backend by name"""
+    backend = backend or SHARED_STATE_BACKEND
+    if backend == "memory":
+        return InProcessState()
+    if backend == "sqlite":
+        return SQLiteState()
+    raise ValueError(f"Unknown SHARED_STATE_BACKEND: {backend}")
+
+
+def get_shared_state() -> SharedState:
+    """Process-wide shared state, created on first use"""
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = create_shared_state()
+    return _state
+
+
+def set_shared_state(state: Optional[SharedState]):
+    """Replace the process-wide shared state (None recreates it from config on next use)"""
+    global _state
+    _state = state
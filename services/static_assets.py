@@ -0,0 +1,120 @@
+"""
+Precompressed, content-hashed static assets for the dashboards.
+
+At startup every stylesheet and script under static/ is fingerprinted
+(styles.css -> styles.<hash>.css) and compressed once with gzip and brotli.
+HTML pages are rewritten to reference the fingerprinted names, so assets can be cached forever while the
+pages themselves are revalidated with ETags.
+"""
+
+import brotli
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Scope
+
+from services.http_cache import compute_etag, cached_response
+
+HASHED_EXTENSIONS = (".css", ".js")
+BUNDLED_EXTENSIONS = HASHED_EXTENSIONS + (".html",)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+_ASSET_REF_RE = re.compile(r"""(href|src)=(["'])([^"'?#:]+)\2""")
+
+
+class BundledAsset:
+    """A static file held in memory with its precompressed variants"""
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str):
+        self.body = body
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.etag = compute_etag(body)
+        self.encodings: Dict[str, bytes] = {
+            "gzip": gzip.compress(body, compresslevel=9),
+            "br": brotli.compress(body),
+        }
+
+
+class StaticBundle:
+    """Fingerprinted and precompressed copies of the files in a static directory"""
+
+    def __init__(self, directory: str, url_prefix: str = "/static"):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        self.assets: Dict[str, BundledAsset] = {}
+        self.manifest: Dict[str, str] = {}  # original name -> hashed name
+        self._build()
+
+    def _build(self):
+        """Hash scripts and stylesheets first, then rewrite HTML pages to use them"""
+        files = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(BUNDLED_EXTENSIONS):
+                    full_path = os.path.join(root, name)
+                    rel_path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                    with open(full_path, "rb") as f:
+                        files[rel_path] = f.read()
+
+        for rel_path, body in files.items():
+            if not rel_path.endswith(HASHED_EXTENSIONS):
+                continue
+            stem, ext = os.path.splitext(rel_path)
+            hashed_path = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+            media_type = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+            self.manifest[rel_path] = hashed_path
+            self.assets[hashed_path] = BundledAsset(body, media_type, IMMUTABLE_CACHE_CONTROL)
+            # Unhashed name stays available for stale pages, but must revalidate
+            self.assets[rel_path] = BundledAsset(body, media_type, REVALIDATE_CACHE_CONTROL)
+
+        for rel_path, body in files.items():
+            if rel_path.endswith(".html"):
+                html = self._rewrite_references(body.decode("utf-8"), os.path.dirname(rel_path))
+                self.assets[rel_path] = BundledAsset(html.encode("utf-8"), "text/html", REVALIDATE_CACHE_CONTROL)
+
+    def _rewrite_references(self, html: str, base_dir: str) -> str:
+        """Point href/src attributes at the fingerprinted asset URLs"""
+        def replace(match):
+            attr, quote, ref = match.groups()
+            if ref.startswith("/"):
+                return match.group(0)
+            target = os.path.normpath(os.path.join(base_dir, ref)).replace(os.sep, "/")
+            hashed_path = self.manifest.get(target)
+            if not hashed_path:
+                return match.group(0)
+            return f"{attr}={quote}{self.url_prefix}/{hashed_path}{quote}"
+
+        return _ASSET_REF_RE.sub(replace, html)
+
+    def response(self, path: str, headers) -> Optional[Response]:
+        """Serve a bundled file, or None if the path is not part of the bundle"""
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+        return cached_response(
+            asset.body, asset.media_type, asset.etag, asset.cache_control, headers, encodings=asset.encodings
+        )
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves bundled assets first and falls back to disk"""
+
+    def __init__(self, *, directory: str, url_prefix: str = "/static", **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.bundle = StaticBundle(directory, url_prefix)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] in ("GET", "HEAD"):
+            response = self.bundle.response(path, Headers(scope=scope))
+            if response is not None:
+                return response
+        return await super().get_response(path, scope)
@@ -0,0 +1,197 @@
+"""
+Unit tests for dashboard delivery
+Tests the bootstrap endpoint, conditional GET, and precompressed static assets
+"""
+
+import brotli
+import gzip
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from auth import create_access_token
+from database import Base, get_db, User, PatientRecord, HealthSummary, DoctorPatientAccess
+from main import app
+from services.http_cache import choose_encoding, etag_matches
+from services.static_assets import StaticBundle, IMMUTABLE_CACHE_CONTROL
+
+
+@pytest.fixture
+def db_session():
+    """In-memory database with one doctor, one patient and one summarized record"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+
+    doctor = User(email="doc@example.com", full_name="Dr. House", password_hash="x", role="doctor")
+    patient = User(email="pat@example.com", full_name="Pat Doe", password_hash="x", role="patient")
+    session.add_all([doctor, patient])
+    session.commit()
+
+    record = PatientRecord(patient_id=patient.id, file_name="rx.pdf", prescription_text="On metformin.")
+    session.add(record)
+    session.commit()
+    session.add(HealthSummary(
+        record_id=record.id, summary="Diabetic on metformin.",
+        medications=json.dumps(["metformin"]), allergies=json.dumps([]), risks=json.dumps(["diabetes"])
+    ))
+    session.add(DoctorPatientAccess(doctor_id=doctor.id, patient_id=patient.id))
+    session.commit()
+
+    def override_get_db():
+        yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield session
+    app.dependency_overrides.pop(get_db, None)
+    session.close()
+
+
+def _auth_header(user):
+    token = create_access_token({"user_id": user.id, "email": user.email, "role": user.role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _user(session, role):
+    return session.query(User).filter(User.role == role).first()
+
+
+class TestHttpCache:
+    """Test ETag and encoding negotiation helpers"""
+
+    def test_etag_matches_list_and_weak(self):
+        assert etag_matches('"a", "b"', '"b"')
+        assert etag_matches('W/"b"', '"b"')
+        assert not etag_matches('"a"', '"b"')
+        assert not etag_matches(None, '"b"')
+
+    def test_choose_encoding_prefers_brotli(self):
+        assert choose_encoding("gzip, br", ["gzip", "br"]) == "br"
+        assert choose_encoding("gzip, br;q=0", ["gzip", "br"]) == "gzip"
+        assert choose_encoding("identity", ["gzip", "br"]) is None
+
+    def test_choose_encoding_wildcard(self):
+        assert choose_encoding("*", ["gzip", "br"]) == "br"
+        assert choose_encoding("br;q=0, *", ["gzip", "br"]) == "gzip"
+        assert choose_encoding("*;q=0", ["gzip", "br"]) is None
+        assert choose_encoding("gzip, *;q=0", ["gzip", "br"]) == "gzip"
+
+
+class TestDashboardBootstrap:
+    """Test the aggregated dashboard endpoint"""
+
+    def setup_method(self):
+        self.client = TestClient(app)
+
+    def test_patient_gets_own_records(self, db_session):
+        patient = _user(db_session, "patient")
+        resp = self.client.get("/dashboard/bootstrap", headers=_auth_header(patient))
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["user"]["email"] == "pat@example.com"
+        assert data["patients"] == []
+        assert data["records"][0]["summary"]["medications"] == ["metformin"]
+
+    def test_doctor_gets_patients_and_records(self, db_session):
+        doctor = _user(db_session, "doctor")
+        data = self.client.get("/dashboard/bootstrap", headers=_auth_header(doctor)).json()
+        assert [p["email"] for p in data["patients"]] == ["pat@example.com"]
+        assert data["records"][0]["file_name"] == "rx.pdf"
+
+    def test_conditional_get_returns_304(self, db_session):
+        headers = _auth_header(_user(db_session, "patient"))
+        first = self.client.get("/dashboard/bootstrap", headers=headers)
+        etag = first.headers["ETag"]
+        second = self.client.get("/dashboard/bootstrap", headers={**headers, "If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.content == b""
+
+    def test_etag_changes_with_data(self, db_session):
+        patient = _user(db_session, "patient")
+        headers = _auth_header(patient)
+        etag = self.client.get("/dashboard/bootstrap", headers=headers).headers["ETag"]
+        db_session.add(PatientRecord(patient_id=patient.id, file_name="labs.pdf"))
+        db_session.commit()
+        resp = self.client.get("/dashboard/bootstrap", headers={**headers, "If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+
+    def test_gzipped_bootstrap_has_own_etag(self, db_session, monkeypatch):
+        from services import http_cache
+        monkeypatch.setattr(http_cache, "GZIP_MINIMUM_SIZE", 1)
+        headers = _auth_header(_user(db_session, "patient"))
+        gzipped = self.client.get("/dashboard/bootstrap", headers={**headers, "Accept-Encoding": "gzip"})
+        identity = self.client.get("/dashboard/bootstrap", headers={**headers, "Accept-Encoding": "identity"})
+        assert gzipped.headers["Content-Encoding"] == "gzip"
+        assert gzipped.headers["ETag"] != identity.headers["ETag"]
+        again = self.client.get("/dashboard/bootstrap", headers={
+            **headers, "Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["ETag"]
+        })
+        assert again.status_code == 304
+
+    def test_requires_authentication(self, db_session):
+        assert self.client.get("/dashboard/bootstrap").status_code == 401
+
+
+class TestStaticAssets:
+    """Test fingerprinted, precompressed static files"""
+
+    def setup_method(self):
+        self.client = TestClient(app)
+
+    def test_bundle_rewrites_html_references(self, tmp_path):
+        (tmp_path / "styles.css").write_text("body { color: red; }")
+        (tmp_path / "page.html").write_text('<link rel="stylesheet" href="styles.css"><a href="https://x.org/a.css">')
+        bundle = StaticBundle(str(tmp_path))
+        hashed = bundle.manifest["styles.css"]
+        assert hashed.startswith("styles.") and hashed.endswith(".css") and hashed != "styles.css"
+        html = bundle.assets["page.html"].body.decode()
+        assert f'href="/static/{hashed}"' in html
+        assert 'href="https://x.org/a.css"' in html
+
+    def test_hashed_asset_is_immutable_and_gzipped(self):
+        from main import static_files
+        hashed = static_files.bundle.manifest["styles.css"]
+        resp = self.client.get(f"/static/{hashed}", headers={"Accept-Encoding": "gzip"})
+        assert resp.status_code == 200
+        assert resp.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+        assert resp.headers["Content-Encoding"] == "gzip"
+        with open("static/styles.css", "rb") as f:
+            assert resp.content == f.read()
+
+    def test_html_page_revalidates(self):
+        resp = self.client.get("/static/doctor-dashboard.html")
+        assert resp.status_code == 200
+        assert resp.headers["Cache-Control"] == "no-cache"
+        again = self.client.get("/static/doctor-dashboard.html", headers={"If-None-Match": resp.headers["ETag"]})
+        assert again.status_code == 304
+
+    def test_etag_differs_per_encoding(self):
+        from main import static_files
+        hashed = static_files.bundle.manifest["styles.css"]
+        gzipped = self.client.get(f"/static/{hashed}", headers={"Accept-Encoding": "gzip"})
+        identity = self.client.get(f"/static/{hashed}", headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in identity.headers
+        assert gzipped.headers["ETag"] != identity.headers["ETag"]
+        # An identity validator must not revalidate the gzip representation
+        resp = self.client.get(f"/static/{hashed}", headers={
+            "Accept-Encoding": "gzip", "If-None-Match": identity.headers["ETag"]
+        })
+        assert resp.status_code == 200
+
+    def test_hashed_asset_served_as_brotli(self):
+        from main import static_files
+        hashed = static_files.bundle.manifest["styles.css"]
+        resp = self.client.get(f"/static/{hashed}", headers={"Accept-Encoding": "br"})
+        assert resp.headers["Content-Encoding"] == "br"
+        assert resp.headers["ETag"].endswith('-br"')
+        with open("static/styles.css", "rb") as f:
+            assert brotli.decompress(static_files.bundle.assets[hashed].encodings["br"]) == f.read()
+
+    def test_raw_gzip_body_matches_source(self):
+        from main import static_files
+        asset = static_files.bundle.assets["styles.css"]
+        assert gzip.decompress(asset.encodings["gzip"]) == asset.body
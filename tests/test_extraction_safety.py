@@ -0,0 +1,141 @@
+"""
+Fuzz and performance tests for entity extraction on adversarial input
+Tests linear-time behaviour, chunked scanning, and the CPU time budget
+"""
+
+import random
+import time
+import pytest
+from services import openai_service
+from services.openai_service import generate_health_summary, _simple_entity_extract
+
+# Generous bound so the suite stays stable on slow CI runners; the quadratic
+# patterns this guards against took over 10 seconds on these inputs
+MAX_SECONDS = 1.5
+# A single MAX_EXTRACT_CHUNK pass; unbounded separators took ~0.2 s here
+MAX_CHUNK_SECONDS = 0.1
+
+PATHOLOGICAL_INPUTS = {
+    "unterminated_allergy_to": "allergy to " + "x " * 40000,
+    "repeated_allergy_to": "allergies to word " * 5000,
+    "repeated_allergy_colon": "Allergies: " * 8000,
+    "allergy_list_hits_forbidden_char": "Allergies: " + "allergy to a " * 6000 + "-",
+    "cad_without_chest": "cad " * 20000,
+    "whitespace_run": "allergies to" + " " * 80000 + "q",
+    "whitespace_after_allergy_to": "allergy to " + " " * 19980 + "#",
+    "whitespace_after_allergies_colon": "Allergies: " + " " * 19980 + "#",
+    "unpunctuated_ocr_dump": ("patient on metformin with cad and allergies to penicillin latex " * 2000),
+}
+
+
+def _timed_extract(text):
+    start = time.perf_counter()
+    result = _simple_entity_extract(text)
+    return result, time.perf_counter() - start
+
+
+class TestPathologicalInputs:
+    """Worst-case latency on inputs that defeat naive regexes"""
+
+    @pytest.mark.parametrize("name", sorted(PATHOLOGICAL_INPUTS))
+    def test_bounded_latency(self, name):
+        result, elapsed = _timed_extract(PATHOLOGICAL_INPUTS[name])
+        assert elapsed < MAX_SECONDS, f"{name} took {elapsed:.2f}s"
+        assert result["partial"] is False
+
+    @pytest.mark.parametrize("name", ["whitespace_after_allergy_to", "whitespace_after_allergies_colon"])
+    def test_single_chunk_bounded_latency(self, name):
+        """The budget is checked between chunks, so one chunk must stay well under it"""
+        text = PATHOLOGICAL_INPUTS[name]
+        assert len(text) <= openai_service.MAX_EXTRACT_CHUNK
+        _, elapsed = _timed_extract(text)
+        assert elapsed < MAX_CHUNK_SECONDS, f"{name} took {elapsed:.3f}s"
+
+    def test_latency_grows_linearly(self):
+        """Doubling the input should not quadruple the time"""
+        small = "cad allergies to aaa " * 5000
+        _, t_small = _timed_extract(small)
+        _, t_large = _timed_extract(small * 4)
+        assert t_large < max(t_small, 0.01) * 12
+
+    def test_fuzzed_inputs(self):
+        """Random soup of extraction keywords and separators"""
+        rng = random.Random(1234)
+        tokens = ["allergy", "allergies", "to", "Allergies:", "cad", "chest", "(", ")", ",", ";", ".",
+                  "-", "\n", " ", "  ", "mi", "penicillin", "metformin", "and", "x" * 50]
+        for _ in range(20):
+            text = " ".join(rng.choice(tokens) for _ in range(rng.randint(1000, 20000)))
+            result, elapsed = _timed_extract(text)
+            assert elapsed < MAX_SECONDS
+            assert isinstance(result["allergies"], list)
+
+
+class TestChunkedScanning:
+    """Long inputs are scanned in overlapping chunks"""
+
+    def test_entities_found_across_chunks(self, monkeypatch):
+        monkeypatch.setattr(openai_service, "MAX_EXTRACT_CHUNK", 2000)
+        filler = "routine visit notes " * 200
+        text = "On metformin. " + filler + "Allergies: latex." + filler + "History of COPD."
+        result = _simple_entity_extract(text)
+        assert "metformin" in result["medications"]
+        assert "latex" in result["allergies"]
+        assert "COPD" in result["risks"]
+
+    def test_match_on_chunk_boundary_not_truncated(self, monkeypatch):
+        monkeypatch.setattr(openai_service, "MAX_EXTRACT_CHUNK", 2000)
+        text = "x " * 990 + "allergy to peanuts and shellfish. done"
+        result = _simple_entity_extract(text)
+        assert result["allergies"] == ["peanuts", "shellfish"]
+
+    @pytest.mark.parametrize("word", ["aspirinate", "insulinoma"])
+    def test_medication_cut_at_chunk_end_not_matched(self, monkeypatch, word):
+        monkeypatch.setattr(openai_service, "MAX_EXTRACT_CHUNK", 2000)
+        text = "y" * 1992 + f" {word} noted on imaging."
+        assert _simple_entity_extract(text)["medications"] == []
+
+    def test_medication_on_chunk_boundary_found_once(self, monkeypatch):
+        monkeypatch.setattr(openai_service, "MAX_EXTRACT_CHUNK", 2000)
+        text = "y" * 1992 + " aspirin daily " + "z " * 1000
+        assert _simple_entity_extract(text)["medications"] == ["aspirin"]
+
+    def test_chunk_does_not_end_mid_word(self, monkeypatch):
+        monkeypatch.setattr(openai_service, "MAX_EXTRACT_CHUNK", 1005)
+        chunks = [c for c, last in openai_service._iter_chunks("abcdefghij " * 300) if not last]
+        assert chunks
+        assert all(c.endswith("abcdefghij") for c in chunks)
+
+    def test_allergy_with_long_separator_on_chunk_boundary(self, monkeypatch):
+        """Bounded separators keep every match shorter than the chunk overlap"""
+        monkeypatch.setattr(openai_service, "MAX_EXTRACT_CHUNK", 2000)
+        text = "x " * 985 + "allergy to" + " " * 18 + "peanuts and shellfish. " + "z " * 1000
+        assert _simple_entity_extract(text)["allergies"] == ["peanuts", "shellfish"]
+
+    def test_chunk_does_not_start_mid_word(self, monkeypatch):
+        monkeypatch.setattr(openai_service, "MAX_EXTRACT_CHUNK", 1000)
+        chunks = [c for c, _ in openai_service._iter_chunks("abcdefghij " * 300)]
+        assert len(chunks) > 1
+        assert all(c.startswith("abcdefghij") for c in chunks)
+
+
+class TestTimeBudget:
+    """Extraction stops gracefully once the CPU budget is spent"""
+
+    def test_partial_result_when_budget_exhausted(self, monkeypatch):
+        monkeypatch.setattr(openai_service, "MAX_EXTRACT_CHUNK", 1000)
+        monkeypatch.setattr(openai_service, "EXTRACT_TIME_BUDGET_SECONDS", 0.0)
+        text = "On metformin. " + "filler words " * 2000 + "Also on warfarin."
+        result = _simple_entity_extract(text)
+        assert result["partial"] is True
+        assert "metformin" in result["medications"]
+        assert "warfarin" not in result["medications"]
+
+    def test_summary_reports_partial(self, monkeypatch):
+        monkeypatch.setattr(openai_service, "MAX_EXTRACT_CHUNK", 1000)
+        monkeypatch.setattr(openai_service, "EXTRACT_TIME_BUDGET_SECONDS", 0.0)
+        result = generate_health_summary("On metformin. " + "filler words " * 2000)
+        assert result["partial"] is True
+
+    def test_short_input_is_complete(self):
+        result = generate_health_summary("Patient on metformin, allergy to penicillin.")
+        assert result["partial"] is False
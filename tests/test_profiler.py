@@ -0,0 +1,172 @@
+"""
+Unit tests for on-demand request profiling
+Tests trigger rules, the bounded profile ring, and the profiling endpoints
+"""
+
+import pstats
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+from auth import create_access_token
+from services import profiler
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    """Store profiles in a temporary directory"""
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiler, "PROFILE_SAMPLE_RATE", 0.0)
+    return tmp_path
+
+
+def _auth_header(role):
+    token = create_access_token({"user_id": 1, "email": f"{role}@example.com", "role": role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TestProfileTrigger:
+    """Test when a request gets profiled"""
+
+    def test_doctor_with_header_is_profiled(self):
+        assert profiler.should_profile({"role": "doctor"}, "1")
+
+    def test_patient_with_header_is_not_profiled(self):
+        assert not profiler.should_profile({"role": "patient"}, "1")
+
+    def test_no_header_and_no_sampling_is_not_profiled(self):
+        assert not profiler.should_profile({"role": "doctor"}, None)
+
+    def test_sampling_rate_triggers_profile(self, monkeypatch):
+        monkeypatch.setattr(profiler, "PROFILE_SAMPLE_RATE", 1.0)
+        assert profiler.should_profile({"role": "doctor"}, None)
+
+
+class TestProfileRing:
+    """Test profile storage"""
+
+    def test_profile_is_stored(self):
+        with profiler.profile_request("summarize") as profile:
+            sum(range(1000))
+        assert profile["profile_id"]
+        assert profiler.get_profile_path(profile["profile_id"])
+        assert "function calls" in profiler.render_profile_text(profile["profile_id"])
+
+    def test_ring_evicts_oldest(self, monkeypatch):
+        monkeypatch.setattr(profiler, "PROFILE_MAX_FILES", 3)
+        ids = []
+        for _ in range(5):
+            with profiler.profile_request("summarize") as profile:
+                pass
+            ids.append(profile["profile_id"])
+        stored = [p["id"] for p in profiler.list_profiles()]
+        assert len(stored) == 3
+        assert ids[-1] in stored
+
+    def test_zero_ring_size_keeps_latest(self, monkeypatch):
+        monkeypatch.setattr(profiler, "PROFILE_MAX_FILES", 0)
+        with profiler.profile_request("summarize") as profile:
+            pass
+        assert profiler.get_profile_path(profile["profile_id"])
+
+    def test_render_evicted_profile_returns_none(self, monkeypatch):
+        with profiler.profile_request("summarize") as profile:
+            pass
+        monkeypatch.setattr(profiler, "get_profile_path", lambda _: "/nonexistent/evicted.prof")
+        assert profiler.render_profile_text(profile["profile_id"]) is None
+
+    def test_concurrent_profile_runs_unprofiled(self):
+        with profiler.profile_request("summarize") as outer:
+            with profiler.profile_request("summarize") as inner:
+                pass
+        assert inner["profile_id"] is None
+        assert outer["profile_id"]
+
+    def test_other_threads_not_recorded(self):
+        """Only the profiled request's thread shows up in the stats"""
+        started, stop = threading.Event(), threading.Event()
+
+        def concurrent_request_marker():
+            return sum(range(100))
+
+        def concurrent_request():
+            started.set()
+            while not stop.is_set():
+                concurrent_request_marker()
+
+        def profiled_request_marker():
+            return sum(range(1000))
+
+        worker = threading.Thread(target=concurrent_request)
+        worker.start()
+        started.wait()
+        try:
+            with profiler.profile_request("summarize") as profile:
+                for _ in range(50):
+                    profiled_request_marker()
+                    threading.Event().wait(0.001)
+        finally:
+            stop.set()
+            worker.join()
+
+        stats = pstats.Stats(profiler.get_profile_path(profile["profile_id"])).stats
+        names = {func for _, _, func in stats}
+        assert "profiled_request_marker" in names
+        assert "concurrent_request_marker" not in names
+        marker = next(v for k, v in stats.items() if k[2] == "profiled_request_marker")
+        assert marker[1] == 50
+
+    def test_invalid_profile_id_rejected(self):
+        assert profiler.get_profile_path("../../etc/passwd") is None
+
+
+class TestProfileEndpoints:
+    """Test profiling through the API"""
+
+    def setup_method(self):
+        from main import app
+        self.client = TestClient(app)
+
+    def test_summarize_without_header_not_profiled(self):
+        resp = self.client.post("/summarize", json={"text": "On metformin."}, headers=_auth_header("doctor"))
+        assert resp.status_code == 200
+        assert "X-Profile-Id" not in resp.headers
+
+    def test_summarize_profiled_and_downloadable(self):
+        headers = {**_auth_header("doctor"), "X-Profile": "1"}
+        resp = self.client.post("/summarize", json={"text": "On metformin."}, headers=headers)
+        assert resp.status_code == 200
+        profile_id = resp.headers["X-Profile-Id"]
+
+        listing = self.client.get("/debug/profiles", headers=_auth_header("doctor")).json()
+        assert listing[0]["id"] == profile_id
+
+        download = self.client.get(f"/debug/profiles/{profile_id}", headers=_auth_header("doctor"))
+        assert download.status_code == 200
+        assert len(download.content) > 0
+
+    def test_profiling_cached_note_shows_extraction(self):
+        text = "Cached note: on warfarin, allergy to latex."
+        headers = _auth_header("doctor")
+        assert self.client.post("/summarize", json={"text": text}, headers=headers).status_code == 200
+
+        resp = self.client.post("/summarize", json={"text": text}, headers={**headers, "X-Profile": "1"})
+        profile_id = resp.headers["X-Profile-Id"]
+        report = self.client.get(f"/debug/profiles/{profile_id}?format=text", headers=headers).text
+        assert "_simple_entity_extract" in report
+
+    def test_profiles_require_doctor(self):
+        resp = self.client.get("/debug/profiles", headers=_auth_header("patient"))
+        assert resp.status_code == 403
+
+    def test_text_report_of_evicted_profile_returns_404(self, monkeypatch):
+        import main
+        monkeypatch.setattr(main, "render_profile_text", lambda _: None)
+        with profiler.profile_request("summarize") as profile:
+            pass
+        resp = self.client.get(f"/debug/profiles/{profile['profile_id']}?format=text", headers=_auth_header("doctor"))
+        assert resp.status_code == 404
+
+    def test_missing_profile_returns_404(self):
+        resp = self.client.get("/debug/profiles/0000000000000-summarize-deadbeef", headers=_auth_header("doctor"))
+        assert resp.status_code == 404
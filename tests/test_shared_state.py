@@ -0,0 +1,149 @@
+"""
+Unit tests for the shared state layer
+Tests TTLs, atomic counters and LRU eviction on both backends, plus the
+auth, summary and rate-limit code paths that use it
+"""
+
+import multiprocessing
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token, verify_token
+from services import openai_service, shared_state
+from services.shared_state import InProcessState, SQLiteState, create_shared_state
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    """Each backend with room for three entries"""
+    if request.param == "memory":
+        return InProcessState(max_entries=3)
+    return SQLiteState(path=str(tmp_path / "state.db"), max_entries=3, evict_every=1)
+
+
+@pytest.fixture
+def fresh_state():
+    """Isolated process-wide state for code paths that use get_shared_state()"""
+    state = InProcessState()
+    shared_state.set_shared_state(state)
+    yield state
+    shared_state.set_shared_state(None)
+
+
+def _sqlite_incr_worker(path, n):
+    worker_state = SQLiteState(path=path)
+    for _ in range(n):
+        worker_state.incr("counter")
+
+
+class TestBackends:
+    """Behaviour shared by every backend"""
+
+    def test_set_get_delete(self, state):
+        state.set("a", {"x": [1, 2]})
+        assert state.get("a") == {"x": [1, 2]}
+        state.delete("a")
+        assert state.get("a") is None
+
+    def test_ttl_expiry(self, state):
+        state.set("a", 1, ttl=0.05)
+        assert state.get("a") == 1
+        time.sleep(0.1)
+        assert state.get("a") is None
+
+    @pytest.mark.parametrize("ttl", [0, -5, 1e-9])
+    def test_non_positive_ttl_never_stored(self, state, ttl):
+        state.set("a", 1)
+        state.set("a", 2, ttl=ttl)
+        assert state.get("a") is None
+        assert state.incr("c", ttl=ttl) == 1
+        assert state.incr("c", ttl=ttl) == 1
+
+    def test_incr_keeps_original_expiry(self, state):
+        assert state.incr("c", ttl=0.05) == 1
+        assert state.incr("c", ttl=10) == 2
+        time.sleep(0.1)
+        assert state.incr("c") == 1
+
+    def test_lru_eviction(self, state):
+        state.set("a", 1)
+        time.sleep(0.01)
+        state.set("b", 2)
+        time.sleep(0.01)
+        state.set("c", 3)
+        time.sleep(0.01)
+        state.set("d", 4)
+        assert state.get("a") is None
+        assert state.get("d") == 4
+
+    def test_clear(self, state):
+        state.set("a", 1)
+        state.clear()
+        assert state.get("a") is None
+
+    def test_unknown_backend_rejected(self):
+        with pytest.raises(ValueError):
+            create_shared_state("redis")
+
+
+class TestSQLiteAcrossProcesses:
+    """The SQLite backend is shared by separate worker processes"""
+
+    def test_value_visible_to_second_instance(self, tmp_path):
+        path = str(tmp_path / "state.db")
+        SQLiteState(path=path).set("k", "v")
+        assert SQLiteState(path=path).get("k") == "v"
+
+    def test_incr_is_atomic_across_processes(self, tmp_path):
+        path = str(tmp_path / "state.db")
+        SQLiteState(path=path)
+        workers = [multiprocessing.Process(target=_sqlite_incr_worker, args=(path, 50)) for _ in range(4)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        assert SQLiteState(path=path).get("counter") == 200
+
+
+class TestStateConsumers:
+    """Auth, summarization and throttling use the shared state"""
+
+    def test_verified_token_is_cached(self, fresh_state):
+        token = create_access_token({"user_id": 7, "email": "d@example.com", "role": "doctor"})
+        assert verify_token(token)["user_id"] == 7
+        assert any(key.startswith("auth:token:") for key in fresh_state._data)
+
+    def test_invalid_token_not_cached(self, fresh_state):
+        assert verify_token("not-a-token") is None
+        assert len(fresh_state._data) == 0
+
+    def test_summary_is_cached(self, fresh_state, monkeypatch):
+        calls = []
+        original = openai_service._summarize
+        monkeypatch.setattr(openai_service, "_summarize", lambda text: calls.append(text) or original(text))
+        first = openai_service.generate_health_summary("Patient on metformin.")
+        second = openai_service.generate_health_summary("Patient on metformin.")
+        assert first == second
+        assert len(calls) == 1
+
+    def test_summarize_not_throttled_by_default(self, fresh_state):
+        assert main.SUMMARIZE_RATE_LIMIT == 0
+        client = TestClient(main.app)
+        token = create_access_token({"user_id": 43, "email": "b@example.com", "role": "patient"})
+        headers = {"Authorization": f"Bearer {token}"}
+        statuses = {client.post("/summarize", json={"text": "On aspirin."}, headers=headers).status_code
+                    for _ in range(5)}
+        assert statuses == {200}
+
+    def test_summarize_rate_limited(self, fresh_state, monkeypatch):
+        monkeypatch.setattr(main, "SUMMARIZE_RATE_LIMIT", 2)
+        # One window spanning centuries, so the requests cannot straddle a window boundary
+        monkeypatch.setattr(main, "SUMMARIZE_RATE_WINDOW", 10 ** 10)
+        client = TestClient(main.app)
+        token = create_access_token({"user_id": 42, "email": "p@example.com", "role": "patient"})
+        headers = {"Authorization": f"Bearer {token}"}
+        statuses = [client.post("/summarize", json={"text": "On aspirin."}, headers=headers).status_code
+                    for _ in range(3)]
+        assert statuses == [200, 200, 429]